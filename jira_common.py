@@ -0,0 +1,325 @@
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import urlparse
+import ijson
+import json
+import orjson
+import os
+import re
+import time
+from dateutil.parser import isoparse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# === CONFIGURATION ===
+JIRA_USERNAME = os.getenv("JIRA_USERNAME")
+JIRA_API_TOKEN = os.getenv("JIRA_API_TOKEN")
+JIRA_SERVER = os.getenv("JIRA_SERVER")
+
+SEARCH_URL = f"{JIRA_SERVER}/rest/api/3/search"
+ISSUE_BASE = f"{JIRA_SERVER}/rest/api/3/issue/"
+BOARD_BASE = f"{JIRA_SERVER}/rest/agile/1.0/board"
+
+# Number of concurrent requests per pool, kept low to stay clear of Jira rate limits
+MAX_WORKERS = 8
+
+# === HTTP SESSION ===
+# Share one session so every request reuses pooled keep-alive connections
+SESSION = requests.Session()
+SESSION.auth = HTTPBasicAuth(JIRA_USERNAME, JIRA_API_TOKEN)
+SESSION.headers["Content-Type"] = "application/json"
+adapter = HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        # Searches are read-only POSTs, so they are as safe to retry as GETs
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST"}
+    )
+)
+SESSION.mount("https://", adapter)
+SESSION.mount("http://", adapter)
+
+
+def decode_json(response):
+    """Decode a JSON response body with orjson, which is much faster than the stdlib parser"""
+    return orjson.loads(response.content)
+
+
+# Jira time spent components like "2d", "4h" or "30m" (1 week = 5 days, 1 day = 8 hours)
+_TIME_RE = re.compile(r'(\d+)\s*([wdhm])')
+_TIME_UNIT_MINUTES = {"w": 5 * 8 * 60, "d": 8 * 60, "h": 60, "m": 1}
+
+# Number of sprints requested per page from the agile API
+SPRINT_PAGE_SIZE = 50
+
+# === SPRINT CACHE ===
+# Closed sprints rarely change, so they are kept on disk between runs
+CACHE_DIR = os.path.expanduser("~/.cache/jira-scripts")
+SPRINT_CACHE_TTL = 60 * 60  # seconds
+
+
+def _sprint_cache_path(board_id):
+    """Path of the closed sprint cache file for a board"""
+    host = urlparse(JIRA_SERVER or "").netloc.replace(":", "_")
+    return os.path.join(CACHE_DIR, f"closed-sprints-{host}-{board_id}.json")
+
+
+def _load_cached_sprints(board_id):
+    """Load the cached sprint data for a board, or None if missing or expired
+
+    The cache holds the closed sprints and the IDs of the sprints that were
+    active when it was written.
+    """
+    cache_path = _sprint_cache_path(board_id)
+    try:
+        if time.time() - os.path.getmtime(cache_path) > SPRINT_CACHE_TTL:
+            return None
+        with open(cache_path) as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(cached, dict) or "closed" not in cached or "active_ids" not in cached:
+        return None
+    return cached
+
+
+def _save_cached_sprints(board_id, sprints):
+    """Save the closed sprints and active sprint IDs for a board, ignoring any cache write failure"""
+    cached = {
+        "active_ids": [sprint["id"] for sprint in sprints if sprint["state"] == "active"],
+        "closed": [sprint for sprint in sprints if sprint["state"] == "closed"]
+    }
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(_sprint_cache_path(board_id), "w") as cache_file:
+            json.dump(cached, cache_file)
+    except OSError:
+        pass
+
+
+def _fetch_sprint_page(board_id, states, startAt):
+    """Fetch a single page of sprints in the given comma-separated states for a board"""
+    sprint_url = f"{BOARD_BASE}/{board_id}/sprint"
+    params = {"state": states, "startAt": startAt, "maxResults": SPRINT_PAGE_SIZE}
+    return decode_json(SESSION.get(sprint_url, params=params))
+
+
+def _fetch_sprints(board_id, states):
+    """Fetch every sprint in the given comma-separated states for a board"""
+    # Jira returns every requested state in a single paginated result
+    data = _fetch_sprint_page(board_id, states, 0)
+    all_sprints = data.get("values", [])
+    page_size = data.get("maxResults") or len(all_sprints)
+
+    if not data.get("isLast", True) and page_size:
+        if "total" in data:
+            # The total is known, so request every remaining page concurrently
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                pages = executor.map(
+                    lambda startAt: _fetch_sprint_page(board_id, states, startAt),
+                    range(page_size, data["total"], page_size)
+                )
+                for page in pages:
+                    all_sprints.extend(page.get("values", []))
+        else:
+            # No total reported, follow isLast one page at a time
+            startAt = len(all_sprints)
+            isLast = False
+            while not isLast:
+                page = _fetch_sprint_page(board_id, states, startAt)
+                all_sprints.extend(page.get("values", []))
+                isLast = page.get("isLast", True) or not page.get("values")
+                startAt += len(page.get("values", []))
+
+    return all_sprints
+
+
+@lru_cache(maxsize=None)
+def get_all_sprints(board_id):
+    """Get all sprints for a given board, both active and closed"""
+    # Active and future sprints are always fetched, closed ones only when the cache is fresh
+    all_sprints = None
+    cached = _load_cached_sprints(board_id)
+    if cached is not None:
+        all_sprints = _fetch_sprints(board_id, "active,future")
+        active_ids = {sprint["id"] for sprint in all_sprints if sprint["state"] == "active"}
+        if set(cached["active_ids"]) <= active_ids:
+            all_sprints.extend(cached["closed"])
+        else:
+            # A sprint has closed since the cache was written, so it is missing from both lists
+            all_sprints = None
+
+    if all_sprints is None:
+        all_sprints = _fetch_sprints(board_id, "active,closed,future")
+        _save_cached_sprints(board_id, all_sprints)
+
+    for sprint in all_sprints:
+        sprint["state_display"] = sprint["state"].upper()
+
+    return all_sprints
+
+
+def paged_search(jql, fields=("summary", "worklog"), page_size=500):
+    """Run a JQL search and return the issues from every result page"""
+
+    def fetch_page(start_at):
+        # POST keeps long JQL out of the URL and only the listed fields are returned
+        payload = {
+            "jql": jql,
+            "fields": list(fields),
+            "fieldsByKeys": False,
+            "maxResults": page_size,
+            "startAt": start_at
+        }
+        response = SESSION.post(SEARCH_URL, json=payload)
+        # Fail loudly rather than reading an error body as a page with no issues
+        response.raise_for_status()
+        return decode_json(response)
+
+    # The first page reports the total and the page size Jira actually used,
+    # so the remaining pages can be requested together
+    first_page = fetch_page(0)
+    issues = first_page.get("issues", [])
+    total = first_page.get("total", 0)
+    step = first_page.get("maxResults") or page_size
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for page in executor.map(fetch_page, range(step, total, step)):
+            issues.extend(page.get("issues", []))
+
+    return issues
+
+
+def optional_search(jql, fields=("summary", "worklog")):
+    """Run a JQL search that Jira may reject, returning no issues when it answers with a 400
+
+    Queries using add-on functions such as ScriptRunner's issueFunction are
+    rejected outright on instances without the add-on.
+    """
+    try:
+        return paged_search(jql, fields)
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 400:
+            raise
+        return []
+
+
+def get_boards():
+    """Get all boards visible to the current user"""
+    return decode_json(SESSION.get(BOARD_BASE)).get("values", [])
+
+
+def _fetch_worklogs(issue, started_after=None, stream=False):
+    """Fetch the worklogs for a single issue, optionally only those started after an epoch time in ms
+
+    With stream, the per-issue worklog response is parsed incrementally and every
+    other author's worklog is dropped as soon as it is parsed, so only the current
+    user's worklogs since started_after are ever held in memory. Issues whose
+    worklogs are all embedded in the search results are never fetched again, so
+    stream does not apply to them.
+    """
+    # Search results embed the first worklogs of each issue, so only go back
+    # to Jira when some of them were left out
+    worklog = issue["fields"].get("worklog")
+    if worklog and worklog.get("total", 0) <= len(worklog.get("worklogs", [])):
+        return issue, worklog["worklogs"]
+
+    worklog_url = ISSUE_BASE + issue["key"] + "/worklog"
+    params = {"startedAfter": started_after} if started_after is not None else None
+    if stream:
+        with SESSION.get(worklog_url, params=params, timeout=30, stream=True) as response:
+            response.raw.decode_content = True
+            # Jira already applies startedAfter, so only the author is left to check
+            worklogs = [
+                log for log in ijson.items(response.raw, "worklogs.item")
+                if log["author"]["emailAddress"] == JIRA_USERNAME
+            ]
+        return issue, worklogs
+
+    response = SESSION.get(worklog_url, params=params, timeout=30)
+    return issue, decode_json(response).get("worklogs", [])
+
+
+def fetch_worklogs_parallel(issues, started_after=None, stream=False):
+    """Fetch the worklogs of every issue concurrently, yielding (issue, worklogs) in order"""
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        yield from executor.map(lambda issue: _fetch_worklogs(issue, started_after, stream), issues)
+
+
+def collect_worklogs(issues, since, stream=False):
+    """Collect the current user's worklogs started on or after since for the given issues"""
+    all_worklogs = []
+
+    # Let Jira drop older worklogs before sending them
+    started_after = int(datetime.strptime(since, "%Y-%m-%dT%H:%M:%S.%f%z").timestamp() * 1000)
+
+    # Only the HTTP calls run in the pool; filtering stays on the calling thread
+    for issue, worklogs in fetch_worklogs_parallel(issues, started_after, stream):
+        key = issue["key"]
+        summary = issue["fields"]["summary"]
+
+        for log in worklogs:
+            author = log["author"]["emailAddress"]
+            started = log["started"]
+            time_spent = log["timeSpent"]
+            comment = log.get("comment", {}).get("content", [])
+
+            if author == JIRA_USERNAME and utc_timestamp(started) >= since:
+                comment_text = ""
+                if comment and isinstance(comment, list):
+                    comment_text = " ".join(
+                        chunk["text"]
+                        for block in comment
+                        for chunk in block.get("content", ())
+                        if chunk.get("type") == "text"
+                    )
+
+                started_date = started.split("T")[0]
+                all_worklogs.append({
+                    "started": started,
+                    "started_date": started_date,
+                    "key": key,
+                    "summary": summary,
+                    "time_spent": time_spent,
+                    "comment_text": comment_text
+                })
+
+    return all_worklogs
+
+
+def parse_time_spent(time_str):
+    """Parse Jira time spent strings like '2d 4h 30m' into minutes"""
+    return sum(int(amount) * _TIME_UNIT_MINUTES[unit] for amount, unit in _TIME_RE.findall(time_str))
+
+
+def utc_timestamp(date_str):
+    """Normalise a Jira ISO 8601 date to a UTC timestamp like '2024-01-31T09:00:00.000+0000'
+
+    Normalised timestamps compare correctly as plain strings. Dates already in
+    UTC only need reformatting; other offsets, such as the '+10:00' Jira Server
+    returns, are converted.
+    """
+    if date_str.endswith(("Z", "+0000", "+00:00")):
+        return date_str[:19] + ".000+0000"
+    return isoparse(date_str).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+
+
+def format_minutes(total_minutes):
+    """Format minutes as hours and minutes only, like '12h 30m'"""
+    hours = total_minutes // 60
+    minutes = total_minutes % 60
+
+    formatted = f"{hours}h"
+    if minutes > 0:
+        formatted += f" {minutes}m"
+    return formatted